@@ -1,15 +1,247 @@
-import json
+import argparse
+import hashlib
 import os
 import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 load_dotenv()
 
+TEST_DIR = Path("src/test/java/com/example/orderservice")
+
+# Everything that does not depend on the endpoint lives here and is sent
+# verbatim at the start of every request, so DeepSeek's context cache can
+# reuse the shared prefix and only the endpoint block is billed in full.
+SYSTEM_PROMPT = "You are a Java testing expert that strictly follows requirements."
+
+STATIC_PROMPT = """
+Generate a JUnit test class for the Spring Boot endpoint in the ENDPOINT DETAILS message.
+
+=== RULES ===
+1. Create Order ONLY with `new Order()` + setters (no other constructor, no builder)
+2. Mock ONLY these OrderService methods:
+   Optional<Order> findOrderById(long id), List<Order> findOrdersByCustomer(String name),
+   Order saveOrder(Order order), double getTotalRevenue()
+3. Use @SpringBootTest + @AutoConfigureMockMvc, `@Autowired private MockMvc mockMvc` and `@MockBean private OrderService orderService`
+4. Test success and error cases with status() and jsonPath() assertions
+5. Return ONLY Java code: `package com.example.orderservice;`, all imports, the full class, no explanations
+
+=== EXAMPLE ===
+Order order = new Order();
+order.setId(1L);
+when(orderService.findOrderById(1L)).thenReturn(Optional.of(order));
+mockMvc.perform(get("/orders/1")).andExpect(status().isOk()).andExpect(jsonPath("$.id").value(1));
+"""
+
+# Every request starts with these two messages; built once and shared
+PREFIX_MESSAGES = (
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "user", "content": STATIC_PROMPT},
+)
+
+# Tried in order: the cheap model first, escalating only when its test
+# fails validation
+MODELS = ["deepseek-chat", "deepseek-coder"]
+
+# Appended instead of a single ENDPOINT DETAILS block when several endpoints
+# share one request, so the static prefix is only paid for once per batch.
+BATCH_PROMPT = """For EACH endpoint below write a separate test class named as given.
+Return one block per endpoint, formatted exactly as:
+```java name=<ClassName>
+<complete Java code>
+```
+"""
+BATCH_BLOCK = re.compile(r"```java name=(\w+)\n(.*?)```", re.S)
+
+# Validation rules as (group name, pattern, message). Each list is folded
+# into one alternation so a test is scanned once per list, not once per rule.
+REQUIREMENTS = [
+    ("spring_boot_test", r"@SpringBootTest", "Missing @SpringBootTest annotation"),
+    ("mock_mvc", r"@Autowired\s+private\s+MockMvc", "Missing MockMvc autowired field"),
+    ("order_service_mock", r"@MockBean\s+private\s+OrderService", "Missing OrderService mock"),
+    ("no_arg_order", r"Order\s+\w+\s*=\s*new\s+Order\(\s*\)", "Order not created with no-arg constructor"),
+    ("setters", r"\.set[A-Z]\w*\(", "Missing property setters"),
+    ("service_mocking", r"when\(orderService\.(?:findOrderById|findOrdersByCustomer|saveOrder|getTotalRevenue)\(", "Incorrect service method mocking"),
+]
+PROHIBITIONS = [
+    ("order_args_constructor", r"new\s+Order\s*\([^)]+\)", "Used Order constructor with arguments"),
+    ("order_constructor", r"(?<!\w)Order\s*\(\s*[^)\s][^)]*\)|Order\.builder\(", "Used Order constructor (any form)"),
+    ("customer_not_found", r"CustomerNotFoundException", "Used forbidden exception"),
+    ("wrong_service_method", r"orderService\.(?:getOrderById|getOrdersByCustomerName|calculateTotalRevenue)", "Used wrong service method names"),
+]
+REQUIRED_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in REQUIREMENTS))
+PROHIBITED_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in PROHIBITIONS))
+PROHIBITION_MESSAGES = {name: message for name, _, message in PROHIBITIONS}
+
+# Local repairs as (name, pattern, replacement), applied before validation so
+# common mistakes are fixed without another LLM round-trip
+LOCAL_FIXES = [
+    ("order_constructor", re.compile(r"new\s+Order\s*\([^)]*\)"), "new Order()"),
+    ("find_order_by_id", re.compile(r"orderService\.getOrderById\b"), "orderService.findOrderById"),
+    ("find_orders_by_customer", re.compile(r"orderService\.getOrdersByCustomerName\b"), "orderService.findOrdersByCustomer"),
+    ("get_total_revenue", re.compile(r"orderService\.calculateTotalRevenue\b"), "orderService.getTotalRevenue"),
+    ("private_mock_mvc", re.compile(r"@Autowired\s+MockMvc\b"), "@Autowired private MockMvc"),
+    ("private_order_service", re.compile(r"@MockBean\s+OrderService\b"), "@MockBean private OrderService"),
+    # Only a stray import is safe to drop; any other use still fails validation
+    ("customer_not_found", re.compile(r"^import\s+[\w.]+\.CustomerNotFoundException;[ \t]*\n?", re.M), ""),
+]
+CLASS_DECLARATION = re.compile(r"^(?:public\s+)?class\s+\w+", re.M)
+PACKAGE_DECLARATION = re.compile(r"^package\s+[\w.]+;[ \t]*\n?", re.M)
+SPRING_BOOT_TEST_IMPORT = "import org.springframework.boot.test.context.SpringBootTest;\n"
+NON_ALPHANUMERIC = re.compile(r"[^a-zA-Z0-9]")
+PATH_VARIABLE = re.compile(r"\{[^}]*\}")
+
+class RateLimiter:
+    """Thread-safe token bucket: allows `requests_per_minute` calls, bursting up to `burst`"""
+
+    def __init__(self, requests_per_minute: int, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going negative reserves a slot, so waiting threads queue up in order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class ResponseCache:
+    """LLM response cache.
+
+    Tier 1 is an exact match on the SHA-256 of the whole request payload
+    (model, temperature and messages included, so changing any of them
+    invalidates the entry). Tier 2 is optional: when semantic_threshold is
+    set, get_similar() finds the most similar previously seen endpoint text
+    within the same group (sentence-transformers + FAISS, cosine >=
+    threshold) and returns its answer together with the stored source, so
+    the caller can adapt the answer instead of replaying it verbatim.
+    """
+
+    def __init__(self, path: str, semantic_threshold: Optional[float] = None,
+                 embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS endpoint_embeddings "
+            "(key TEXT PRIMARY KEY, scope TEXT, vector BLOB, source TEXT)"
+        )
+        self.conn.commit()
+
+        self.semantic_threshold = semantic_threshold
+        self.embedding_model = embedding_model
+        self.encoder = None
+        self.indexes = {}  # scope -> (faiss index, [keys])
+
+    @staticmethod
+    def make_key(payload: Dict) -> str:
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    @staticmethod
+    def make_scope(payload: Dict, group: str = "") -> str:
+        return f"{payload['model']}:{payload.get('temperature')}:{group}"
+
+    def get(self, payload: Dict) -> Optional[str]:
+        key = self.make_key(payload)
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def get_similar(self, payload: Dict, text: str, group: str = "") -> Optional[Tuple[str, str]]:
+        """(response, source) of the closest entry in the same group, if close enough"""
+        if self.semantic_threshold is None:
+            return None
+        with self.lock:
+            return self._semantic_get(self.make_scope(payload, group), text)
+
+    def set(self, payload: Dict, response: str, text: str = None, group: str = "",
+            source: str = None):
+        key = self.make_key(payload)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, ts) VALUES (?, ?, ?)",
+                (key, response, int(time.time()))
+            )
+            if self.semantic_threshold is not None and text is not None:
+                self._semantic_add(self.make_scope(payload, group), key, text, source)
+            self.conn.commit()
+
+    def _embed(self, text: str):
+        if self.encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self.encoder = SentenceTransformer(self.embedding_model)
+        return self.encoder.encode([text], normalize_embeddings=True).astype("float32")
+
+    def _index_for(self, scope: str):
+        if scope not in self.indexes:
+            import faiss
+            import numpy as np
+
+            rows = self.conn.execute(
+                "SELECT key, vector FROM endpoint_embeddings WHERE scope = ?", (scope,)
+            ).fetchall()
+            index, keys = None, []
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype="float32").reshape(1, -1)
+                if index is None:
+                    index = faiss.IndexFlatIP(vector.shape[1])
+                index.add(vector)
+                keys.append(key)
+            self.indexes[scope] = (index, keys)
+        return self.indexes[scope]
+
+    def _semantic_get(self, scope: str, text: str) -> Optional[Tuple[str, str]]:
+        index, keys = self._index_for(scope)
+        if index is None or not keys:
+            return None
+        scores, ids = index.search(self._embed(text), 1)
+        if scores[0][0] < self.semantic_threshold:
+            return None
+        row = self.conn.execute(
+            "SELECT r.response, e.source FROM responses r JOIN endpoint_embeddings e ON e.key = r.key "
+            "WHERE r.key = ?", (keys[ids[0][0]],)
+        ).fetchone()
+        return (row[0], row[1]) if row and row[1] else None
+
+    def _semantic_add(self, scope: str, key: str, text: str, source: str = None):
+        import faiss
+
+        vector = self._embed(text)
+        index, keys = self._index_for(scope)
+        if index is None:
+            index = faiss.IndexFlatIP(vector.shape[1])
+            self.indexes[scope] = (index, keys)
+        index.add(vector)
+        keys.append(key)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO endpoint_embeddings (key, scope, vector, source) VALUES (?, ?, ?, ?)",
+            (key, scope, vector.tobytes(), source)
+        )
+
 class CompatibleTestGenerator:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 8, cache_path: Optional[str] = ".llm_cache.sqlite",
+                 semantic_threshold: Optional[float] = None, batch_size: int = 1,
+                 requests_per_minute: int = 60, models: List[str] = None, force: bool = False):
         self.api_key = os.getenv('DEEPSEEK_API_KEY')
         self.api_url = "https://api.deepseek.com/v1/chat/completions"
         self.headers = {
@@ -17,116 +249,164 @@ class CompatibleTestGenerator:
             "Content-Type": "application/json"
         }
         self.max_retries = 3
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.force = force
+        self.models = models or MODELS
+        self.model_stats = {model: {"attempts": 0, "successes": 0} for model in self.models}
+        self.fix_counts = Counter()
+        # File writes run here, off the threads that wait on the API
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.pending_writes = []
+        self.stats_lock = threading.Lock()
+        self.max_tokens = 1200  # largest test seen so far is ~900 tokens
+        self.timeout = (10, 60)  # (connect, read) seconds
+
+        # One pooled keep-alive session for every endpoint
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=max(32, max_concurrency),
+            max_retries=Retry(total=3, backoff_factor=0.5,
+                              status_forcelist=[429, 500, 502, 503, 504],
+                              allowed_methods=None)
+        )
+        self.session.mount("https://", adapter)
+
+        # Pace requests up front instead of bursting into 429s; the adapter's
+        # Retry still backs off (honouring Retry-After) if one slips through
+        self.rate_limiter = RateLimiter(requests_per_minute)
+
+        # Skip the network entirely for prompts we have already answered
+        self.cache = ResponseCache(cache_path, semantic_threshold) if cache_path else None
 
     def load_endpoints(self, file_path: str) -> List[Dict]:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        return orjson.loads(Path(file_path).read_bytes())
 
     def generate_test_class_name(self, path: str, method: str) -> str:
-        clean_path = re.sub(r'[^a-zA-Z0-9]', '', path.replace('/', '_'))
+        clean_path = NON_ALPHANUMERIC.sub('', path.replace('/', '_'))
         return f"Api{clean_path.capitalize()}{method.capitalize()}Test"
 
-    def build_prompt(self, endpoint: Dict, previous_attempt: str = None) -> str:
-        base_prompt = f"""
-Generate a JUnit test class for this Spring Boot endpoint that strictly follows these requirements:
-
-=== ABSOLUTE REQUIREMENTS ===
-1. Order objects MUST ONLY be created with no-arg constructor + setters:
-   CORRECT:
-   Order order = new Order();
-   order.setId(1L);
-   order.setCustomerName("test");
-
-   WRONG (NEVER USE THESE):
-   - Order order = new Order(1L, "test");  // BANNED
-   - Order order = Order.builder().id(1L).build();  // BANNED
-   - Any other constructor or builder pattern  // BANNED
-
-2. Service layer mocking MUST ONLY use these exact methods:
-   - Optional<Order> findOrderById(long id)
-   - List<Order> findOrdersByCustomer(String name)
-   - Order saveOrder(Order order)
-   - double getTotalRevenue()
-
-=== TEST STRUCTURE ===
-1. Use @SpringBootTest with MockMvc
-2. Include:
-   - @Autowired MockMvc
-   - @MockBean OrderService
-3. Test both success and error cases
-4. Use proper assertions (status(), jsonPath())
-
-=== ENDPOINT DETAILS ===
+    def build_prompt(self, endpoint: Dict) -> str:
+        """Endpoint-specific part of the prompt; always sent after STATIC_PROMPT"""
+        return f"""=== ENDPOINT DETAILS ===
 Path: {endpoint['path']}
 Method: {endpoint['method']}
-Parameters: {json.dumps(endpoint.get('parameters', []), indent=2)}
-Response: {json.dumps(endpoint['response'], indent=2)}
+Parameters: {orjson.dumps(endpoint.get('parameters', []), option=orjson.OPT_INDENT_2).decode()}
+Response: {orjson.dumps(endpoint['response'], option=orjson.OPT_INDENT_2).decode()}
 """
 
-        if previous_attempt:
-            base_prompt += f"""
+    def build_messages(self, endpoint: Dict, previous_attempt: str = None) -> List[Dict]:
+        messages = [*PREFIX_MESSAGES, {"role": "user", "content": self.build_prompt(endpoint)}]
 
-=== PREVIOUS ATTEMPT ERRORS ===
+        if previous_attempt:
+            messages.append({"role": "user", "content": f"""=== PREVIOUS ATTEMPT ERRORS ===
 Your previous attempt contained these errors:
 {previous_attempt}
 
 Please carefully fix these issues in your new attempt.
-"""
+"""})
 
-        base_prompt += """
-
-=== EXAMPLE TEST ===
-@SpringBootTest
-@AutoConfigureMockMvc
-public class ExampleTest {
-    @Autowired private MockMvc mockMvc;
-    @MockBean private OrderService orderService;
-
-    @Test
-    void shouldReturnOrder() throws Exception {
-        // CORRECT Order creation
-        Order order = new Order();
-        order.setId(1L);
-        order.setCustomerName("test");
-        order.setAmount(100.0);
-
-        when(orderService.findOrderById(1L)).thenReturn(Optional.of(order));
-
-        mockMvc.perform(get("/orders/1"))
-            .andExpect(status().isOk())
-            .andExpect(jsonPath("$.id").value(1));
-    }
-}
-
-=== OUTPUT REQUIREMENTS ===
-Return ONLY the complete Java code with:
-1. Package declaration: package com.example.orderservice;
-2. All required imports
-3. Full test class implementation
-4. ABSOLUTELY NO constructor usage other than new Order()
-5. NO explanations or comments outside the code
-"""
+        return messages
 
-        return base_prompt
+    def ordered_models(self) -> List[str]:
+        """Configured models, with ones that keep failing validation moved to the back"""
+        def failing(model):
+            stats = self.model_stats[model]
+            return stats["attempts"] >= 3 and stats["successes"] / stats["attempts"] < 0.3
+        with self.stats_lock:
+            return sorted(self.models, key=failing)
 
-    def generate_test_case(self, endpoint: Dict, previous_attempt: str = None) -> str:
-        prompt = self.build_prompt(endpoint, previous_attempt)
+    def record_result(self, model: str, is_valid: bool):
+        with self.stats_lock:
+            self.model_stats[model]["attempts"] += 1
+            self.model_stats[model]["successes"] += int(is_valid)
+
+    def generate_test_case(self, endpoint: Dict, previous_attempt: str = None, model: str = None) -> str:
         payload = {
-            "model": "deepseek-coder",
-            "messages": [{
-                "role": "system",
-                "content": "You are a Java testing expert that strictly follows requirements."
-            }, {
-                "role": "user",
-                "content": prompt
-            }],
+            "model": model or self.models[0],
+            "messages": self.build_messages(endpoint, previous_attempt),
             "temperature": 0.1,  # Very low for maximum consistency
-            "max_tokens": 3000
+            "max_tokens": self.max_tokens,
+            "stream": True
         }
 
-        response = requests.post(self.api_url, headers=self.headers, json=payload)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
+        # Only first attempts may be served by a similar endpoint; a retry
+        # must not get back the answer that just failed validation
+        return self.complete(payload, None if previous_attempt else endpoint,
+                             f"{endpoint['method']} {endpoint['path']}")
+
+    def generate_tests_batch(self, endpoints: List[Dict]) -> Dict[str, str]:
+        """Generate tests for several endpoints in one call; returns {class_name: code}"""
+        details = []
+        for i, endpoint in enumerate(endpoints, 1):
+            class_name = self.generate_test_class_name(endpoint['path'], endpoint['method'])
+            details.append(f"#{i} Class name: {class_name}\n{self.build_prompt(endpoint)}")
+
+        payload = {
+            "model": self.ordered_models()[0],
+            "messages": [
+                *PREFIX_MESSAGES,
+                {"role": "user", "content": BATCH_PROMPT + "\n" + "\n".join(details)}
+            ],
+            "temperature": 0.1,
+            "max_tokens": min(8192, self.max_tokens * len(endpoints)),
+            "stream": True
+        }
+
+        content = self.complete(payload, label=f"batch of {len(endpoints)} endpoints")
+        return {name: code.strip() for name, code in BATCH_BLOCK.findall(content)}
+
+    def complete(self, payload: Dict, endpoint: Dict = None, label: str = "") -> str:
+        """Send a chat completion request, going through the response cache.
+
+        With `endpoint`, a miss may be served by the cached test of a similar
+        endpoint with the same signature, retargeted through template_test().
+        """
+        similarity_text = self.build_prompt(endpoint) if endpoint else None
+        group = repr(self.signature(endpoint)) if endpoint else ""
+        if self.cache:
+            cached = self.cache.get(payload)
+            if cached is not None:
+                print(f"💾 Cache hit for {label}")
+                return cached
+            if similarity_text:
+                similar = self.cache.get_similar(payload, similarity_text, group)
+                retargeted = similar and self.template_test(similar[0], orjson.loads(similar[1]), endpoint)
+                if retargeted:
+                    print(f"💾 Similar-endpoint cache hit for {label}")
+                    return retargeted
+
+        self.rate_limiter.acquire()
+        with self.session.post(self.api_url, data=orjson.dumps(payload), timeout=self.timeout,
+                               stream=payload.get("stream", False)) as response:
+            response.raise_for_status()
+            if payload.get("stream"):
+                content = self.read_stream(response)
+            else:
+                content = orjson.loads(response.content)['choices'][0]['message']['content']
+
+        if self.cache:
+            source = orjson.dumps(endpoint).decode() if endpoint else None
+            self.cache.set(payload, content, similarity_text, group, source)
+        return content
+
+    def read_stream(self, response: requests.Response) -> str:
+        """Accumulate the content deltas of a server-sent-events completion"""
+        response.encoding = "utf-8"
+        parts = []
+        for line in response.iter_lines(decode_unicode=True):
+            # Skip blank separators and ": keep-alive" comments
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data == "[DONE]":
+                break
+            choices = orjson.loads(data)["choices"]
+            if choices:
+                parts.append(choices[0]["delta"].get("content") or "")
+        return "".join(parts)
 
     def validate_test_case(self, test_code: str) -> Dict:
         results = {
@@ -135,99 +415,151 @@ Return ONLY the complete Java code with:
             "problematic_lines": []
         }
 
-        # Required patterns
-        requirements = [
-            (r"@SpringBootTest", "Missing @SpringBootTest annotation"),
-            (r"@Autowired\s+private\s+MockMvc", "Missing MockMvc autowired field"),
-            (r"@MockBean\s+private\s+OrderService", "Missing OrderService mock"),
-            (r"Order\s+\w+\s*=\s*new\s+Order\(\s*\)", "Order not created with no-arg constructor"),
-            (r"\.set[A-Z]\w*\(", "Missing property setters"),
-            (r"when\(orderService\.(findOrderById|findOrdersByCustomer|saveOrder|getTotalRevenue)\(", "Incorrect service method mocking"),
-        ]
-
-        # Forbidden patterns
-        prohibitions = [
-            (r"new\s+Order\s*\([^)]+\)", "Used Order constructor with arguments"),
-            (r"Order\s*\([^)]*\)", "Used Order constructor (any form)"),
-            (r"CustomerNotFoundException", "Used forbidden exception"),
-            (r"orderService\.(getOrderById|getOrdersByCustomerName|calculateTotalRevenue)", "Used wrong service method names"),
-        ]
-
         # Check requirements
-        for pattern, message in requirements:
-            if not re.search(pattern, test_code):
+        seen = {match.lastgroup for match in REQUIRED_RE.finditer(test_code)}
+        for name, _, message in REQUIREMENTS:
+            if name not in seen:
                 results["is_valid"] = False
                 results["errors"].append(f"Missing: {message}")
 
-        # Check prohibitions
-        for pattern, message in prohibitions:
-            matches = re.finditer(pattern, test_code)
-            for match in matches:
-                results["is_valid"] = False
-                results["errors"].append(f"Prohibited: {message}")
-                results["problematic_lines"].append(match.group(0))
-
-        # Remove duplicate errors
-        results["errors"] = list(dict.fromkeys(results["errors"]))
-        results["problematic_lines"] = list(dict.fromkeys(results["problematic_lines"])[:3])
+        # Check prohibitions, keeping errors and the first 3 snippets unique
+        seen_errors, seen_lines = set(), set()
+        for match in PROHIBITED_RE.finditer(test_code):
+            results["is_valid"] = False
+            error = f"Prohibited: {PROHIBITION_MESSAGES[match.lastgroup]}"
+            if error not in seen_errors:
+                seen_errors.add(error)
+                results["errors"].append(error)
+            snippet = match.group(0)
+            if snippet not in seen_lines and len(results["problematic_lines"]) < 3:
+                seen_lines.add(snippet)
+                results["problematic_lines"].append(snippet)
 
         return results
 
     def fix_common_issues(self, test_code: str) -> str:
         """Attempt to automatically fix common issues"""
-        # Fix constructor usage
-        test_code = re.sub(
-            r"new\s+Order\s*\([^)]*\)",
-            "new Order()",
-            test_code
-        )
-
-        # Ensure proper service method names
-        test_code = re.sub(
-            r"orderService\.getOrderById\(",
-            "orderService.findOrderById(",
-            test_code
-        )
-
+        applied = []
+        for name, pattern, replacement in LOCAL_FIXES:
+            test_code, count = pattern.subn(replacement, test_code)
+            if count:
+                applied.append(name)
+
+        # Add a missing @SpringBootTest to the test class
+        class_match = CLASS_DECLARATION.search(test_code)
+        if class_match and "@SpringBootTest" not in test_code:
+            test_code = test_code[:class_match.start()] + "@SpringBootTest\n" + test_code[class_match.start():]
+            if SPRING_BOOT_TEST_IMPORT not in test_code:
+                package_match = PACKAGE_DECLARATION.search(test_code)
+                idx = package_match.end() if package_match else 0
+                test_code = test_code[:idx] + SPRING_BOOT_TEST_IMPORT + test_code[idx:]
+            applied.append("spring_boot_test")
+
+        with self.stats_lock:
+            self.fix_counts.update(applied)
         return test_code
 
-    def save_test_file(self, test_code: str, endpoint: Dict):
-        class_name = self.generate_test_class_name(endpoint['path'], endpoint['method'])
-        package_path = "src/test/java/com/example/orderservice"
-        test_dir = Path(package_path)
-        test_dir.mkdir(parents=True, exist_ok=True)
+    @staticmethod
+    def signature(endpoint: Dict) -> tuple:
+        """Endpoints with the same signature only differ by path, so they can share one test"""
+        return (endpoint['method'],
+                tuple(sorted((p['name'], p['type']) for p in endpoint.get('parameters', []))),
+                endpoint['response']['type'])
+
+    def template_test(self, test_code: str, exemplar: Dict, endpoint: Dict) -> Optional[str]:
+        """Rewrite the exemplar's test for `endpoint` by swapping the URL and class name"""
+        exemplar_parts = PATH_VARIABLE.split(exemplar['path'])
+        endpoint_parts = PATH_VARIABLE.split(endpoint['path'])
+        if len(exemplar_parts) != len(endpoint_parts):
+            return None
+
+        # Path variables may appear as placeholders or concrete values; keep whatever was used
+        url = re.compile('"' + '([^"/]+)'.join(map(re.escape, exemplar_parts)) + '"')
+
+        def retarget(match):
+            values = match.groups() + ("",)
+            return '"' + "".join(part + value for part, value in zip(endpoint_parts, values)) + '"'
+
+        test_code, count = url.subn(retarget, test_code)
+        if not count:
+            return None
+        # The model picks its own class name, so rename whatever was actually declared
+        declaration = CLASS_DECLARATION.search(test_code)
+        if not declaration:
+            return None
+        old_name = declaration.group(0).split()[-1]
+        new_name = self.generate_test_class_name(endpoint['path'], endpoint['method'])
+        return re.sub(rf"\b{old_name}\b", new_name, test_code)
+
+    def test_file_path(self, endpoint: Dict) -> Path:
+        return TEST_DIR / f"{self.generate_test_class_name(endpoint['path'], endpoint['method'])}.java"
+
+    def endpoint_hash(self, endpoint: Dict) -> str:
+        return hashlib.sha256(orjson.dumps(endpoint, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def is_up_to_date(self, endpoint: Dict) -> bool:
+        """True if a valid test was saved for this exact endpoint definition"""
+        file_path = self.test_file_path(endpoint)
+        sidecar = file_path.with_suffix(".java.srchash")
+        return (file_path.exists() and sidecar.exists()
+                and sidecar.read_text() == self.endpoint_hash(endpoint))
 
-        file_path = test_dir / f"{class_name}.java"
+    def save_test_file(self, test_code: str, endpoint: Dict):
+        file_path = self.test_file_path(endpoint)
 
         # Ensure package declaration exists
         if not test_code.strip().startswith("package"):
             test_code = f"package com.example.orderservice;\n\n{test_code}"
 
-        with open(file_path, 'w') as f:
-            f.write(test_code)
-        print(f"✅ Successfully saved valid test: {file_path}")
+        self.write_file(file_path, test_code, f"✅ Successfully saved valid test: {file_path}")
+        self.write_file(file_path.with_suffix(".java.srchash"), self.endpoint_hash(endpoint))
+
+    def write_file(self, file_path: Path, content: str, message: str = None):
+        """Queue a write on the writer thread so the caller can move on to its next LLM call"""
+        def write():
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(file_path, 'w') as f:
+                f.write(content)
+            if message:
+                print(message)
+
+        with self.stats_lock:
+            self.pending_writes.append(self.writer.submit(write))
+
+    def flush_writes(self):
+        with self.stats_lock:
+            pending, self.pending_writes = self.pending_writes, []
+        for future in pending:
+            try:
+                future.result()
+            except OSError as e:
+                print(f"⚠️ Error writing test file: {str(e)}")
 
     def process_endpoint(self, endpoint: Dict):
         print(f"\n🔧 Processing {endpoint['method']} {endpoint['path']}")
 
         test_code = None
         validation_results = None
+        models = self.ordered_models()
 
         for attempt in range(self.max_retries):
             try:
-                print(f"Attempt {attempt + 1}/{self.max_retries}")
+                # Escalate to the next model after each failed attempt
+                model = models[min(attempt, len(models) - 1)]
+                print(f"Attempt {attempt + 1}/{self.max_retries} ({model})")
 
                 previous_errors = "\n".join(validation_results["errors"]) if validation_results else None
-                test_code = self.generate_test_case(endpoint, previous_errors)
+                test_code = self.generate_test_case(endpoint, previous_errors, model)
 
                 # Apply automatic fixes
                 test_code = self.fix_common_issues(test_code)
 
                 validation_results = self.validate_test_case(test_code)
+                self.record_result(model, validation_results["is_valid"])
 
                 if validation_results["is_valid"]:
                     self.save_test_file(test_code, endpoint)
-                    return
+                    return test_code
                 else:
                     print("❌ Validation failed:")
                     for error in validation_results["errors"]:
@@ -246,34 +578,116 @@ Return ONLY the complete Java code with:
         print(f"❌ Failed to generate valid test after {self.max_retries} attempts")
 
         # Save the best attempt for debugging
-        debug_dir = Path("debug_failed_tests")
-        debug_dir.mkdir(exist_ok=True)
-        debug_file = debug_dir / f"failed_{self.generate_test_class_name(endpoint['path'], endpoint['method'])}.java"
+        debug_file = Path("debug_failed_tests") / f"failed_{self.generate_test_class_name(endpoint['path'], endpoint['method'])}.java"
+        self.write_file(debug_file, test_code, f"💾 Saved failed attempt to: {debug_file}")
 
-        with open(debug_file, 'w') as f:
-            f.write(test_code)
-        print(f"💾 Saved failed attempt to: {debug_file}")
+    def process_group(self, endpoints: List[Dict]):
+        """Generate a test for the first endpoint and template it for the rest of the group"""
+        exemplar, *others = endpoints
+        test_code = None
+        try:
+            test_code = self.process_endpoint(exemplar)
+        except Exception as e:
+            print(f"⛔ Critical error processing {exemplar['path']}: {str(e)}")
+
+        for endpoint in others:
+            templated = self.template_test(test_code, exemplar, endpoint) if test_code else None
+            if templated and self.validate_test_case(templated)["is_valid"]:
+                print(f"📋 Reused test of {exemplar['method']} {exemplar['path']} for {endpoint['path']}")
+                self.save_test_file(templated, endpoint)
+                continue
 
-    def cleanup_old_tests(self):
-        test_dir = Path("src/test/java/com/example/orderservice")
-        for file in test_dir.glob("Api*.java"):
+            # Could not template it: fall back to a dedicated request
             try:
-                file.unlink()
-                print(f"🗑️ Deleted old test: {file}")
+                self.process_endpoint(endpoint)
             except Exception as e:
-                print(f"⚠️ Error deleting {file}: {str(e)}")
+                print(f"⛔ Critical error processing {endpoint['path']}: {str(e)}")
 
-    def process_endpoints(self, endpoints_file: str):
-        self.cleanup_old_tests()
-        endpoints = self.load_endpoints(endpoints_file)
+    def process_batch(self, endpoints: List[Dict]):
+        print(f"\n📦 Processing batch of {len(endpoints)} endpoints")
+        try:
+            results = self.generate_tests_batch(endpoints)
+        except Exception as e:
+            print(f"⚠️ Batch request failed: {str(e)}")
+            results = {}
 
         for endpoint in endpoints:
+            test_code = results.get(self.generate_test_class_name(endpoint['path'], endpoint['method']))
+            if test_code:
+                test_code = self.fix_common_issues(test_code)
+                if self.validate_test_case(test_code)["is_valid"]:
+                    self.save_test_file(test_code, endpoint)
+                    continue
+
+            # Missing or invalid in the batch answer: fall back to a dedicated call
             try:
                 self.process_endpoint(endpoint)
             except Exception as e:
                 print(f"⛔ Critical error processing {endpoint['path']}: {str(e)}")
+
+    def cleanup_old_tests(self, keep: set = frozenset()):
+        """Delete generated tests (and their hash sidecars) except those in `keep`"""
+        for file in TEST_DIR.glob("Api*.java"):
+            if file in keep:
                 continue
+            try:
+                file.unlink()
+                file.with_suffix(".java.srchash").unlink(missing_ok=True)
+                print(f"🗑️ Deleted old test: {file}")
+            except Exception as e:
+                print(f"⚠️ Error deleting {file}: {str(e)}")
+
+    def process_endpoints(self, endpoints_file: str):
+        endpoints = self.load_endpoints(endpoints_file)
+
+        # Regenerate everything with --force; otherwise only drop tests of
+        # endpoints that no longer exist and skip the unchanged ones
+        if self.force:
+            self.cleanup_old_tests()
+        else:
+            self.cleanup_old_tests(keep={self.test_file_path(e) for e in endpoints})
+            unchanged = [e for e in endpoints if self.is_up_to_date(e)]
+            for endpoint in unchanged:
+                print(f"↩ Unchanged, keeping existing test: {endpoint['method']} {endpoint['path']}")
+            endpoints = [e for e in endpoints if e not in unchanged]
+
+        # Endpoints are independent, so overlap their LLM round-trips
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            if self.batch_size > 1:
+                batches = [endpoints[i:i + self.batch_size]
+                           for i in range(0, len(endpoints), self.batch_size)]
+                for future in as_completed([pool.submit(self.process_batch, b) for b in batches]):
+                    future.result()
+            else:
+                # One LLM call per group of structurally identical endpoints
+                groups = defaultdict(list)
+                for endpoint in endpoints:
+                    groups[self.signature(endpoint)].append(endpoint)
+                for future in as_completed([pool.submit(self.process_group, g) for g in groups.values()]):
+                    future.result()
+
+        self.flush_writes()
+        if self.fix_counts:
+            print("\n🔧 Local fixes applied: " +
+                  ", ".join(f"{name} x{count}" for name, count in self.fix_counts.most_common()))
 
 if __name__ == "__main__":
-    generator = CompatibleTestGenerator()
+    parser = argparse.ArgumentParser(description="Generate JUnit tests for Spring Boot endpoints")
+    parser.add_argument("--force", action="store_true",
+                        help="Regenerate every test, even for unchanged endpoints")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the model; don't read or write .llm_cache.sqlite")
+    parser.add_argument("--semantic-threshold", type=float, default=None,
+                        help="Reuse the cached test of a similar endpoint at this cosine similarity "
+                             "(e.g. 0.95; needs sentence-transformers and faiss-cpu)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Endpoints per request (default: 1, one request per endpoint)")
+    args = parser.parse_args()
+
+    generator = CompatibleTestGenerator(
+        cache_path=None if args.no_cache else ".llm_cache.sqlite",
+        semantic_threshold=args.semantic_threshold,
+        batch_size=args.batch_size,
+        force=args.force,
+    )
     generator.process_endpoints("../2-static-analysis/endpoints.json")
\ No newline at end of file
@@ -23,7 +23,7 @@ Highlights
     – stub when(fooRepo.findAll()) … List.of(...)
     – comment out any `assertThrows` tests so they compile
     – auto‑import ResponseEntity in controller tests
-* Requires: Python 3.10+, openai>=1.0.0, python‑dotenv.
+* Requires: Python 3.10+, openai>=1.0.0, httpx[http2], python‑dotenv.
 
 Usage
 -----
@@ -32,20 +32,30 @@ Usage
 from __future__ import annotations
 
 import argparse
+import functools
+import hashlib
+import json
+import mmap
 import os
+import random
 import re
+import sqlite3
 import sys
-import textwrap
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
+from openai import (APIConnectionError, InternalServerError, OpenAI, OpenAIError,
+                    RateLimitError)
 
 # ──────────────────────────────────────────────────────────────────────────────
 # regex helpers
 # ──────────────────────────────────────────────────────────────────────────────
-CODE_BLOCK      = re.compile(r"```(?:java)?\s*([\s\S]*?)```", re.MULTILINE)
 INT_IN_PARENS   = re.compile(r"(?<=\()\s*(\d+)\s*(?=[,)])")
 SET_TOTAL       = re.compile(r"\.setTotal\((\d+(?:\.\d+)?)\)")
 ASSERT_EQ       = re.compile(r"assertEquals\((\d+(?:\.\d+)?),\s*result\)")
@@ -53,6 +63,45 @@ AUTOWIRED_REPO  = re.compile(r"@Autowired\s+private\s+(\w+Repository)\s+(\w+);")
 VALIDATION_MAX  = re.compile(r"total\s*>\s*(\d+(?:\.\d+)?)")
 ENUM_FILTER     = re.compile(r"(\w+Status)\.(\w+)")
 ENUM_DECL       = re.compile(r"enum\s+(\w+Status)\s*\{([^}]*)}")
+PACKAGE_DECL    = re.compile(r"^\s*package\s+([\w.]+);", re.MULTILINE)
+DOUBLE_METHOD   = re.compile(r"(?:public|protected|private)\s+(?:static\s+)?(?:Double|double)\s+(\w+)\s*\(")
+ENUM_FILTER_B   = re.compile(ENUM_FILTER.pattern.encode())   # for mmap scans
+ENUM_DECL_B     = re.compile(ENUM_DECL.pattern.encode())
+
+# ──────────────────────────────────────────────────────────────────────────────
+# prompts – the system prompt is byte‑identical for every file so OpenAI's
+# prompt cache can reuse it; everything file‑specific goes in the user turn.
+# ──────────────────────────────────────────────────────────────────────────────
+SYSTEM_PROMPT = "\n".join([
+    "You are an expert Java/Maven/Mockito developer.",
+    "Write a *complete* JUnit 5 unit test class named <ClassUnderTest>Test.",
+    "Use Mockito for collaborators;",
+    "only add @SpringBootTest if integration requested.",
+    "If a total limit is given, keep every total ≤ that limit.",
+    "Use double literals (1.0, not 1) wherever a Double is expected.",
+    "Emit at most 5 concise @Test methods, no javadoc, no explanations.",
+    "Put the whole test class in the `code` field."
+])
+SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}   # shared, never mutated
+# structured output → the answer is {"code": "..."}, no fences to strip
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name":   "junit_test",
+        "strict": True,
+        "schema": {
+            "type":                 "object",
+            "properties":           {"code": {"type": "string"}},
+            "required":             ["code"],
+            "additionalProperties": False,
+        },
+    },
+}
+PROMPT_CACHE_KEY = "springboot-tests-v1"
+MAX_ATTEMPTS     = 5     # per request, on 429 / 5xx / connection errors
+MAX_TOKENS       = 1024  # ≤5 short tests usually fit …
+MAX_TOKENS_LONG  = 4096  # … otherwise retry once with this cap (finish_reason "length")
+BATCH_POLL_SECS  = 30    # --batch: how often to check on the job
 
 # ──────────────────────────────────────────────────────────────────────────────
 # tiny helpers
@@ -65,196 +114,504 @@ def project_root(start: Path) -> Path:
         cur = cur.parent
     raise FileNotFoundError("pom.xml not found – pass --dir or run inside project")
 
-def clean(text: str) -> str:
-    m = CODE_BLOCK.search(text)
-    return m.group(1).strip() if m else text.strip().strip("`")
+def clean(text: str) -> Optional[str]:
+    """The code field of a structured answer; None if it was cut off (max_tokens)."""
+    try:
+        return json.loads(text)["code"].strip()
+    except (ValueError, KeyError, TypeError):
+        return None
 
+def scan(p: Path, pattern: re.Pattern[bytes]) -> Optional[tuple[str, ...]]:
+    """Search a file via mmap (no full read/decode); returns the match groups."""
+    with open(p, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:                      # empty file
+            return None
+        with mm:
+            m = pattern.search(mm)
+            return tuple(g.decode() for g in m.groups()) if m else None
+
+@functools.lru_cache(maxsize=None)
 def java_package(src: str) -> str:
-    m = re.search(r"^\s*package\s+([\w.]+);", src, re.MULTILINE)
+    m = PACKAGE_DECL.search(src)
     return m.group(1) if m else ""
 
-def double_methods(src: str) -> set[str]:
-    return {
-        m.group(1) for m in re.finditer(
-            r"(?:public|protected|private)\s+(?:static\s+)?(?:Double|double)\s+(\w+)\s*\(", src
-        )
-    }
+def is_skipped(p: Path) -> bool:
+    """Model & service classes get no generated test."""
+    path_str = str(p).replace("\\","/")
+    return "/model/" in path_str or "/service/" in path_str
+
+@functools.lru_cache(maxsize=None)
+def double_methods(src: str) -> frozenset[str]:
+    return frozenset(DOUBLE_METHOD.findall(src))
+
+@functools.lru_cache(maxsize=None)
+def double_call_lines(d_methods: frozenset[str]) -> re.Pattern[str]:
+    """Whole lines calling something that expects a Double: a Double method or money setter."""
+    names = sorted(d_methods) + [s.rstrip("(") for s in MONEY_SETTERS]
+    return re.compile(r"^.*\b(?:" + "|".join(map(re.escape, names)) + r")\(.*$", re.MULTILINE)
+
+class RateLimiter:
+    """Thread‑safe token bucket – `rpm` requests per minute, bursting up to `burst`."""
+    def __init__(self, rpm: int, burst: int = 1):
+        self.rate     = rpm / 60.0
+        self.capacity = burst
+        self.tokens   = float(burst)
+        self.updated  = time.monotonic()
+        self.lock     = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1            # negative → slot reserved, caller waits its turn
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def retry_delay(e: OpenAIError, attempt: int) -> float:
+    """Server's Retry‑After if given, else exponential backoff with jitter."""
+    try:
+        return float(e.response.headers["retry-after"])
+    except (AttributeError, KeyError, ValueError):
+        return 2 ** attempt + random.random()
+
+class ResponseCache:
+    """Exact‑match LLM response cache (SQLite, keyed on sha256 of the request)."""
+    def __init__(self, path: Path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS responses "
+                          "(key TEXT PRIMARY KEY, response TEXT, ts INTEGER)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(**request) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?",
+                                    (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, response: str) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                              (key, response, int(time.time())))
+            self.conn.commit()
 
 # ──────────────────────────────────────────────────────────────────────────────
-# post‑processors
+# post‑processors – fused into one pass over the lines of the generated code
 # ──────────────────────────────────────────────────────────────────────────────
-def clamp_any_literal(code: str, limit: Optional[float]) -> str:
-    if limit is None:
-        return code
-    def repl(m: re.Match) -> str:
-        v = float(m.group(0))
-        return f"{limit*0.9:.0f}" if v > limit else m.group(0)
-    return re.sub(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])", repl, code)
+ANY_LITERAL     = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+THROWS_TEST     = re.compile(r"@Test\s+public void .*Throws.*\{[\s\S]*?\}")
+MONEY_SETTERS   = ("setTotal(", "setAmount(", "setPrice(", "setSubtotal(")
+
+@dataclass(frozen=True)
+class PostContext:
+    """Everything the post‑processors need to know about the class under test."""
+    guard_limit:     Optional[float]
+    uses_bigdecimal: bool
+    d_methods:       frozenset[str]
+    needed_enum:     Optional[str]
+    needed_const:    Optional[str]
+    enum_import:     Optional[str]
+    repo_var:        Optional[str]
+
+class CodeBuffer:
+    """Generated code split once after the package declaration.
+
+    Post‑processors queue imports with add_import(); render() splices them
+    all in with a single concatenation instead of one re‑scan per import.
+    """
+    def __init__(self, code: str):
+        idx = code.find(";", code.find("package")) + 1
+        self.head, self.body = code[:idx], code[idx:]
+        self.imports: set[str] = set()
+
+    def add_import(self, name: str) -> None:
+        if f"import {name};" not in self.body:
+            self.imports.add(name)
+
+    def render(self) -> str:
+        return self.head + "".join(f"\nimport {i};" for i in sorted(self.imports)) + self.body
+
+def clamp(v: float, limit: float) -> float:
+    return v if v <= limit else limit * 0.9
+
+def fix_line(ln: str, ctx: PostContext, add_status: bool) -> str:
+    """Apply every line‑local transform, in the order they depend on each other."""
+    limit = ctx.guard_limit
+    if limit is not None:
+        # clamp .setTotal(x) under the guard, then any other literal
+        ln = SET_TOTAL.sub(lambda m: f".setTotal({clamp(float(m.group(1)), limit)})", ln)
+        ln = ANY_LITERAL.sub(
+            lambda m: f"{limit*0.9:.0f}" if float(m.group(0)) > limit else m.group(0), ln
+        )
+    if ctx.uses_bigdecimal:
+        ln = SET_TOTAL.sub(lambda m: f".setTotal(BigDecimal.valueOf({m.group(1)}))", ln)
+    if add_status:
+        ln = SET_TOTAL.sub(
+            lambda m: f".setStatus({ctx.needed_enum}.{ctx.needed_const});\n        .setTotal({m.group(1)})",
+            ln
+        )
+    return ln.replace("javax.validation", "jakarta.validation")
 
-def fix_validation_imports(code: str) -> str:
-    return code.replace("javax.validation", "jakarta.validation")
+def postprocess(code: str, ctx: PostContext) -> str:
+    # comment out exception‑expecting tests so they compile
+    code = THROWS_TEST.sub(lambda m: "// " + m.group(0).replace("\n", "\n// "), code)
+    buf  = CodeBuffer(code)
 
-def clamp_totals(code: str, limit: Optional[float]) -> str:
-    if limit is None:
-        return code
-    def _clamp(m: re.Match) -> str:
-        v = float(m.group(1))
-        v = v if v <= limit else limit * 0.9
-        return f".setTotal({v})"
-    return SET_TOTAL.sub(_clamp, code)
-
-def adapt_bigdecimal(code: str, src: str) -> str:
-    if "BigDecimal" not in src:
-        return code
-    code = SET_TOTAL.sub(lambda m: f".setTotal(BigDecimal.valueOf({m.group(1)}))", code)
-    if "BigDecimal" in code and "import java.math.BigDecimal;" not in code:
-        idx = code.find(";", code.find("package")) + 1
-        code = code[:idx] + "\nimport java.math.BigDecimal;" + code[idx:]
-    return code
-
-def fix_int_vs_double(code: str, d_methods: set[str]) -> str:
-    money_setters = ("setTotal(", "setAmount(", "setPrice(", "setSubtotal(")
-    out = []
-    for ln in code.splitlines():
-        if any(f"{m}(" in ln for m in d_methods) or any(k in ln for k in money_setters):
-            ln = INT_IN_PARENS.sub(lambda m: f"{m.group(1)}.0", ln)
-        out.append(ln)
-    return "\n".join(out)
-
-def add_status_calls(code: str, needed_enum: str, needed_const: str, enum_import: str) -> str:
-    if not needed_enum or ".setStatus(" in code:
-        return code
-    patched = SET_TOTAL.sub(
-        lambda m: f".setStatus({needed_enum}.{needed_const});\n        .setTotal({m.group(1)})",
-        code
+    # auto‑import ResponseEntity
+    if "ResponseEntity<" in buf.body:
+        buf.add_import("org.springframework.http.ResponseEntity")
+
+    add_status = bool(ctx.needed_enum) and ".setStatus(" not in buf.body
+    findall_stubbed = not ctx.repo_var or f"when({ctx.repo_var}.findAll())" in buf.body
+
+    lines: list[str] = []
+    totals: list[float] = []
+    for ln in buf.body.splitlines():
+        ln = fix_line(ln, ctx, add_status)
+        totals += [float(v) for v in SET_TOTAL.findall(ln)]
+        lines.extend(ln.split("\n"))
+
+    body = "\n".join(lines)
+
+    # 1 → 1.0 where a Double is expected: one sweep over the whole body finds
+    # the affected lines, ints are only rewritten inside those
+    body = double_call_lines(ctx.d_methods).sub(
+        lambda m: INT_IN_PARENS.sub(lambda i: f"{i.group(1)}.0", m.group(0)), body
     )
-    if enum_import and needed_enum not in patched:
-        idx = patched.find(";", patched.find("package")) + 1
-        patched = patched[:idx] + f"\nimport {enum_import}.{needed_enum};" + patched[idx:]
-    return patched
 
-def patch_revenue_assert(code: str) -> str:
-    totals = [float(v) for v in SET_TOTAL.findall(code)]
-    return ASSERT_EQ.sub(lambda m: m.group(0).replace(m.group(1), str(sum(totals))), code)
+    # revenue asserts need the totals of the whole file, so they go second
+    total = str(sum(totals))
+    body  = ASSERT_EQ.sub(lambda m: m.group(0).replace(m.group(1), total), body)
+
+    # stub when(repo.findAll()) right inside the @BeforeEach method
+    if not findall_stubbed:
+        lines = body.split("\n")
+        stub  = f"when({ctx.repo_var}.findAll()).thenReturn(List.of(order1, order2, order3));"
+        for i, ln in enumerate(lines):
+            if "@BeforeEach" in ln:
+                lines.insert(i+2, "        " + stub)
+                buf.add_import("java.util.List")
+                body = "\n".join(lines)
+                break
 
-def stub_findall(code: str, repo_var: Optional[str]) -> str:
-    if not repo_var or f"when({repo_var}.findAll())" in code:
-        return code
-    stub = f"when({repo_var}.findAll()).thenReturn(List.of(order1, order2, order3));"
-    lines = code.splitlines()
-    for i, ln in enumerate(lines):
-        if "@BeforeEach" in ln:
-            lines.insert(i+2, "        " + stub)
-            break
-    if "import java.util.List;" not in code:
-        idx = code.find(";", code.find("package")) + 1
-        code = code[:idx] + "\nimport java.util.List;" + "\n".join(lines[idx:])
-    return "\n".join(lines)
+    buf.body = body
+    if add_status and ctx.enum_import and ctx.needed_enum not in buf.body:
+        buf.add_import(f"{ctx.enum_import}.{ctx.needed_enum}")
+    if ctx.uses_bigdecimal and "BigDecimal" in buf.body:
+        buf.add_import("java.math.BigDecimal")
+    return buf.render()
 
 # ──────────────────────────────────────────────────────────────────────────────
 class Generator:
-    def __init__(self, root: Path, model: str, temp: float, include_integration: bool):
+    def __init__(self, root: Path, model: str, temp: float, include_integration: bool,
+                 workers: int = 8, rpm: int = 500, force: bool = False,
+                 procs: Optional[int] = None, cache_dir: Optional[Path] = None,
+                 use_cache: bool = True, cheap_model: str = "gpt-4o-mini",
+                 strong_model: Optional[str] = None, complex_threshold: int = 2000):
         load_dotenv()
         if "OPENAI_API_KEY" not in os.environ:
             sys.exit("OPENAI_API_KEY missing")
-        self.openai      = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        # one pooled HTTP/2 client multiplexes the concurrent workers' requests;
+        # retries are handled in ask() so they go through the rate limiter
+        self.openai      = OpenAI(
+            api_key=os.environ["OPENAI_API_KEY"],
+            max_retries=0,
+            http_client=httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            ),
+        )
+        self.limiter     = RateLimiter(rpm)
         self.root        = root
         self.model       = model
+        # small classes go to the cheap model, the rest to the strong one
+        self.cheap_model  = cheap_model or model
+        self.strong_model = strong_model or model
+        self.complex_threshold = complex_threshold
         self.temp        = temp
         self.integration = include_integration
-        self.all_src     = {p: p.read_text(encoding="utf-8")
-                            for p in (root/"src/main/java").rglob("*.java")}
-
-    def ask(self, system: str, user: str) -> str:
-        try:
-            r = self.openai.chat.completions.create(
-                model=self.model,
-                temperature=self.temp,
-                messages=[{"role":"system","content":system},
-                          {"role":"user","content":user}],
-            )
-        except OpenAIError as e:
-            sys.exit(f"OpenAI error → {e}")
-        return clean(r.choices[0].message.content)
+        self.workers     = workers
+        self.force       = force
+        self.procs       = procs
+        self.cache       = (ResponseCache((cache_dir or root)/".llm_cache.sqlite")
+                            if use_cache else None)
+        # disk writes go to their own thread so workers return to the API sooner
+        self.writer      = ThreadPoolExecutor(max_workers=1)
+        self.pending: list = []
+        self.failed: list[str] = []   # classes without a usable answer
+        # paths only – file contents are read lazily (and once) via read()
+        self.all_paths   = sorted((root/"src/main/java").rglob("*.java"))
+        self.skipped     = [p for p in self.all_paths if is_skipped(p)]
+        self.targets     = [p for p in self.all_paths if not is_skipped(p)]
+        # project‑wide, so found once here rather than per generated test
+        self.enum        = self.find_enum_filter()
+
+    @functools.lru_cache(maxsize=None)
+    def read(self, p: Path) -> str:
+        return p.read_text(encoding="utf-8")
+
+    def find_enum_filter(self) -> tuple[Optional[str], Optional[str], Optional[str]]:
+        """First `FooStatus.CONST` used anywhere, plus the package declaring FooStatus."""
+        for p in self.all_paths:
+            f = scan(p, ENUM_FILTER_B)
+            if f:
+                needed_enum, needed_const = f
+                for p2 in self.all_paths:
+                    d = scan(p2, ENUM_DECL_B)
+                    if d and d[0] == needed_enum:
+                        return needed_enum, needed_const, java_package(self.read(p2))
+                return needed_enum, needed_const, None
+        return None, None, None
+
+    def pick_model(self, src: str) -> str:
+        return self.cheap_model if len(src) < self.complex_threshold else self.strong_model
+
+    def ask(self, user: str, model: Optional[str] = None) -> Optional[str]:
+        model = model or self.model
+        # model + temperature are part of the key → changing either invalidates
+        key = ResponseCache.key(model=model, temperature=self.temp, max_tokens=MAX_TOKENS,
+                                response_format=RESPONSE_FORMAT, system=SYSTEM_PROMPT, user=user)
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            return clean(cached)
+        answer = self.complete(user, model, MAX_TOKENS)
+        if answer and answer[1] == "length":
+            # a whole class inside JSON can outgrow the cap → one roomier retry
+            print(f"↻ answer hit max_tokens={MAX_TOKENS}, retrying with {MAX_TOKENS_LONG}")
+            answer = self.complete(user, model, MAX_TOKENS_LONG)
+        if answer is None:
+            return None
+        content = answer[0]
+        code = clean(content)
+        if self.cache and code is not None:
+            self.cache.set(key, content)
+        return code
 
-    def generate(self, src_path: Path):
-        src      = self.all_src[src_path]
+    def complete(self, user: str, model: str,
+                 max_tokens: int) -> Optional[tuple[str, Optional[str]]]:
+        """One streamed request → (content, finish_reason), or None on API failure."""
+        for attempt in range(MAX_ATTEMPTS):
+            self.limiter.acquire()
+            try:
+                stream = self.openai.chat.completions.create(
+                    model=model,
+                    temperature=self.temp,
+                    max_tokens=max_tokens,
+                    messages=[SYSTEM_MSG, {"role":"user","content":user}],
+                    response_format=RESPONSE_FORMAT,
+                    extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},
+                    stream=True,
+                )
+                parts, finish = [], None
+                for c in stream:
+                    if c.choices:
+                        parts.append(c.choices[0].delta.content or "")
+                        finish = c.choices[0].finish_reason or finish
+                return "".join(parts), finish
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    print(f"⚠️  OpenAI error → {e}")
+                    return None
+                time.sleep(retry_delay(e, attempt))
+            except OpenAIError as e:
+                # runs in a pool worker → report and let run() decide about exiting
+                print(f"⚠️  OpenAI error → {e}")
+                return None
+
+    def prepare(self, src_path: Path) -> Optional[tuple[Path, str, PostContext, str]]:
+        """Returns (dest, user prompt, context, source hash), or None if up to date."""
+        src      = self.read(src_path)
         pkg      = java_package(src)
         cls      = src_path.stem
+        dest     = (self.root/"src/test/java"/Path(*pkg.split("."))/
+                    f"{cls}Test.java")
+
+        # unchanged source + existing test → nothing to do
+        src_hash = hashlib.sha256(src.encode()).hexdigest()
+        sidecar  = dest.with_suffix(".java.srchash")
+        if (not self.force and dest.exists() and sidecar.exists()
+                and sidecar.read_text() == src_hash):
+            print("↩ cached", dest.relative_to(self.root))
+            return None
+
         repo_m   = AUTOWIRED_REPO.search(src)
         repo_var = repo_m.group(2) if repo_m else None
 
         guard_m     = VALIDATION_MAX.search(src)
         guard_limit = float(guard_m.group(1)) if guard_m else None
 
-        needed_enum = needed_const = enum_import = None
-        for t in self.all_src.values():
-            f = ENUM_FILTER.search(t)
-            if f:
-                needed_enum, needed_const = f.group(1), f.group(2)
-                for p,t2 in self.all_src.items():
-                    d = ENUM_DECL.search(t2)
-                    if d and d.group(1)==needed_enum:
-                        enum_import = java_package(t2)
-                        break
-                break
+        needed_enum, needed_const, enum_import = self.enum
+
+        # just the source plus the few per‑file hints; all instructions are in SYSTEM_MSG
+        usr_prompt = f"```java\n{src}\n```"
+        if guard_limit is not None:
+            usr_prompt += f"\nTotal limit: {guard_limit}"
+        if self.integration:
+            usr_prompt += "\nInclude an @SpringBootTest integration test too."
+
+        return dest, usr_prompt, PostContext(
+            guard_limit     = guard_limit,
+            uses_bigdecimal = "BigDecimal" in src,
+            d_methods       = double_methods(src),
+            needed_enum     = needed_enum,
+            needed_const    = needed_const,
+            enum_import     = enum_import,
+            repo_var        = repo_var,
+        ), src_hash
+
+    def call_llm(self, src_path: Path) -> Optional[tuple[Path, str, PostContext, str]]:
+        """I/O half of generation: returns (dest, raw code, context, source hash)."""
+        job = self.prepare(src_path)
+        if job is None:
+            return None
+        dest, usr_prompt, ctx, src_hash = job
+        code = self.ask(usr_prompt, self.pick_model(self.read(src_path)))
+        if code is None:
+            print(f"⚠️  No usable answer for {src_path.stem}, skipped")
+            self.failed.append(src_path.stem)
+            return None
+        return dest, code, ctx, src_hash
+
+    def ask_batch(self, prompts: dict[str, str], model: Optional[str] = None) -> dict[str, str]:
+        """Answer {custom_id: user prompt} through one Batch API job (½ price, ≤24 h)."""
+        model = model or self.model
+        answers, lines, keys = {}, [], {}
+        for cid, user in prompts.items():
+            key = ResponseCache.key(model=model, temperature=self.temp, max_tokens=MAX_TOKENS,
+                                    response_format=RESPONSE_FORMAT, system=SYSTEM_PROMPT, user=user)
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                answers[cid] = clean(cached)
+                continue
+            keys[cid] = key
+            lines.append(json.dumps({
+                "custom_id": cid,
+                "method":    "POST",
+                "url":       "/v1/chat/completions",
+                "body": {
+                    "model":       model,
+                    "temperature": self.temp,
+                    "max_tokens":  MAX_TOKENS,
+                    "messages":    [SYSTEM_MSG, {"role":"user","content":user}],
+                    "response_format":  RESPONSE_FORMAT,
+                    "prompt_cache_key": PROMPT_CACHE_KEY,
+                },
+            }))
+        if not lines:
+            return answers
 
-        sys_prompt = "\n".join([
-            "You are an expert Java/Maven/Mockito developer.",
-            "Write a *complete* JUnit 5 unit test class.",
-            "Use Mockito for collaborators;",
-            "only add @SpringBootTest if integration requested.",
-            f"If totals must be ≤ {guard_limit} enforce that.",
-            "Return ONLY Java code inside one ```java block`."
-        ])
-        usr_prompt = textwrap.dedent(f"""
-            Generate `{cls}Test` for the class below.
-            ```java
-            {src}
-            ```
-            {'Include an @SpringBootTest integration test too.' if self.integration else ''}
-        """)
-
-        code = self.ask(sys_prompt, usr_prompt)
-
-        # comment out exception‑expecting tests so they compile
-        code = re.sub(
-            r"@Test\s+public void .*Throws.*\{[\s\S]*?\}",
-            lambda m: "// " + m.group(0).replace("\n", "\n// "),
-            code
-        )
+        try:
+            upload = self.openai.files.create(
+                file=("requests.jsonl", "\n".join(lines).encode()), purpose="batch")
+            batch  = self.openai.batches.create(input_file_id=upload.id,
+                                                endpoint="/v1/chat/completions",
+                                                completion_window="24h")
+            print(f"📦 Batch {batch.id}: {len(lines)} requests submitted")
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(BATCH_POLL_SECS)
+                batch = self.openai.batches.retrieve(batch.id)
+                counts = batch.request_counts
+                if counts:
+                    print(f"   {batch.status}: {counts.completed}/{counts.total}")
+            if batch.status != "completed" or not batch.output_file_id:
+                sys.exit(f"Batch {batch.id} ended as {batch.status}")
+            output = self.openai.files.content(batch.output_file_id).text
+        except OpenAIError as e:
+            sys.exit(f"OpenAI error → {e}")
 
-        # auto‑import ResponseEntity
-        if "ResponseEntity<" in code and "import org.springframework.http.ResponseEntity;" not in code:
-            idx = code.find(";", code.find("package"))+1
-            code = code[:idx] + "\nimport org.springframework.http.ResponseEntity;" + code[idx:]
-
-        # pipeline
-        code = clamp_totals(code, guard_limit)
-        code = clamp_any_literal(code, guard_limit)
-        code = adapt_bigdecimal(code, src)
-        code = fix_int_vs_double(code, double_methods(src))
-        code = add_status_calls(code, needed_enum, needed_const, enum_import)
-        code = patch_revenue_assert(code)
-        code = stub_findall(code, repo_var)
-        code = fix_validation_imports(code)
-
-        dest = (self.root/"src/test/java"/Path(*pkg.split("."))/
-                f"{cls}Test.java")
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            rec  = json.loads(line)
+            cid  = rec["custom_id"]
+            resp = rec.get("response") or {}
+            if resp.get("status_code") != 200:
+                print(f"⚠️  No answer for {cid}: {rec.get('error') or resp.get('status_code')}")
+                continue
+            choice  = resp["body"]["choices"][0]
+            content = choice["message"]["content"]
+            if choice.get("finish_reason") == "length":
+                print(f"↻ {cid} hit max_tokens={MAX_TOKENS}, retrying with {MAX_TOKENS_LONG}")
+                retry   = self.complete(prompts[cid], model, MAX_TOKENS_LONG)
+                content = retry[0] if retry else content
+            code    = clean(content)
+            if code is None:
+                print(f"⚠️  Truncated answer for {cid}, skipped")
+                continue
+            if self.cache:
+                self.cache.set(keys[cid], content)
+            answers[cid] = code
+        # non‑200s, truncated answers and requests only listed in the error file
+        self.failed.extend(Path(cid).stem for cid in keys if cid not in answers)
+        return answers
+
+    def write(self, dest: Path, code: str, src_hash: str) -> None:
         dest.parent.mkdir(parents=True, exist_ok=True)
         dest.write_text(code, encoding="utf-8")
+        dest.with_suffix(".java.srchash").write_text(src_hash, encoding="utf-8")
         print("✅", dest.relative_to(self.root))
 
     def run(self):
-        all_files = list(self.all_src)
-        print(f"Found {len(all_files)} source files")
-        for p in all_files:
-            path_str = str(p).replace("\\","/")
-            # skip model & service tests
-            if "/model/" in path_str or "/service/" in path_str:
-                print(f"⚠️  Skipping test for {p.stem}")
-                continue
-            self.generate(p)
+        print(f"Found {len(self.all_paths)} source files")
+        for p in self.skipped:
+            print(f"⚠️  Skipping test for {p.stem}")
+        # openai>=1.0 clients are thread‑safe → overlap the LLM round‑trips;
+        # the regex post‑processing is pure CPU, so it runs in worker processes
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+             ProcessPoolExecutor(max_workers=self.procs) as cpu:
+            post = {}
+            for f in as_completed([pool.submit(self.call_llm, p) for p in self.targets]):
+                job = f.result()
+                if job:
+                    dest, code, ctx, src_hash = job
+                    post[cpu.submit(postprocess, code, ctx)] = (dest, src_hash)
+            self.save(post)
+        for f in self.pending:
+            f.result()
+        self.exit_on_failures()
+
+    def run_batch(self):
+        """Like run(), but every prompt goes out in a single Batch API job."""
+        print(f"Found {len(self.all_paths)} source files")
+        for p in self.skipped:
+            print(f"⚠️  Skipping test for {p.stem}")
+        jobs    = {str(p): job for p in self.targets if (job := self.prepare(p))}
+        # a batch job may only target one model → one job per routed model
+        by_model: dict[str, dict[str, str]] = {}
+        for cid, job in jobs.items():
+            by_model.setdefault(self.pick_model(self.read(Path(cid))), {})[cid] = job[1]
+        answers = {}
+        for model, prompts in by_model.items():
+            answers.update(self.ask_batch(prompts, model))
+        with ProcessPoolExecutor(max_workers=self.procs) as cpu:
+            post = {}
+            for cid, code in answers.items():
+                dest, _, ctx, src_hash = jobs[cid]
+                post[cpu.submit(postprocess, code, ctx)] = (dest, src_hash)
+            self.save(post)
+        for f in self.pending:
+            f.result()
+        self.exit_on_failures()
+
+    def exit_on_failures(self) -> None:
+        """Once every finished test is written, exit non‑zero if any class got no test."""
+        if self.failed:
+            sys.exit(f"{len(self.failed)} class(es) failed: {', '.join(sorted(self.failed))}")
+
+    def save(self, post: dict) -> None:
+        """Hand each finished post‑processing future to the writer thread."""
+        for f in as_completed(post):
+            dest, src_hash = post[f]
+            self.pending.append(self.writer.submit(self.write, dest, f.result(), src_hash))
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser(
@@ -264,7 +621,34 @@ if __name__ == "__main__":
     ap.add_argument("-m","--model", default="gpt-4o-mini")
     ap.add_argument("--temperature", type=float, default=0.0)
     ap.add_argument("--include-integration", action="store_true")
+    ap.add_argument("-j","--workers", type=int, default=8,
+                    help="Concurrent LLM requests (default: 8)")
+    ap.add_argument("--rpm", type=int, default=500,
+                    help="Max OpenAI requests per minute (default: 500)")
+    ap.add_argument("--force", action="store_true",
+                    help="Regenerate tests even when the source is unchanged")
+    ap.add_argument("--procs", type=int, default=None,
+                    help="Post‑processing processes (default: CPU count)")
+    ap.add_argument("--batch", action="store_true",
+                    help="Submit everything as one OpenAI Batch API job (½ price, up to 24 h)")
+    ap.add_argument("--cache-dir", type=Path, default=None,
+                    help="Where to keep .llm_cache.sqlite (default: project root)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Always call the model; don't read or write the response cache")
+    ap.add_argument("--cheap-model", default="gpt-4o-mini",
+                    help="Model for classes under --complex-threshold chars (default: gpt-4o-mini)")
+    ap.add_argument("--strong-model", default=None,
+                    help="Model for larger classes (default: --model)")
+    ap.add_argument("--complex-threshold", type=int, default=2000,
+                    help="Source size in chars from which a class counts as complex (default: 2000)")
     args = ap.parse_args()
 
     root = Path(args.dir) if args.dir else project_root(Path.cwd())
-    Generator(root, args.model, args.temperature, args.include_integration).run()
+    gen  = Generator(root, args.model, args.temperature, args.include_integration,
+                     args.workers, args.rpm, args.force, args.procs,
+                     args.cache_dir, not args.no_cache,
+                     args.cheap_model, args.strong_model, args.complex_threshold)
+    if args.batch:
+        gen.run_batch()
+    else:
+        gen.run()
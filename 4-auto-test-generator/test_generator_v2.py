@@ -6,18 +6,24 @@ project, preserving package structure under src/test/java.
 
 Prereqs
 -------
-pip install openai python-dotenv
+pip install openai "httpx[http2]" python-dotenv
 Create a .env file (or hard‑code) with OPENAI_API_KEY.
 """
 
 from __future__ import annotations
 
+import hashlib
 import os
+import random
+import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Iterable, List, Optional
 
 from dotenv import load_dotenv
+import httpx
 import openai
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -28,9 +34,14 @@ PROJECT_ROOT = Path(r"C:\UofA\ms-llm-testing\1-ms").resolve()  # ← your root d
 TEST_ROOT    = PROJECT_ROOT / "src" / "test" / "java"
 
 GPT_MODEL   = "gpt-4o-mini"    # or gpt-4o / gpt-4
-MAX_TOKENS  = 2048
+MAX_TOKENS  = 1536
 TEMPERATURE = 0.3
 
+MAX_WORKERS  = 16   # concurrent OpenAI requests
+FORCE        = "--force" in sys.argv[1:]   # regenerate even unchanged classes
+MAX_ATTEMPTS = 5    # per file, on rate limiting
+ABORT_CHARS  = 800  # ≈200 tokens of prose before any Java → give up on the answer
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  OPENAI INITIALISATION
 # ──────────────────────────────────────────────────────────────────────────────
@@ -40,15 +51,19 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 if not openai.api_key:
     sys.exit("❌  OPENAI_API_KEY not found (env var or .env file).")
 
+# one pooled HTTP/2 client → the worker threads share kept‑alive connections
+openai.http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_connections=MAX_WORKERS, max_keepalive_connections=MAX_WORKERS),
+    timeout=httpx.Timeout(60.0, connect=10.0),
+)
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  HELPERS
 # ──────────────────────────────────────────────────────────────────────────────
 def iter_java_sources(root: Path) -> Iterable[Path]:
-    """Yield every *.java file under *root* except anything already in /test/."""
-    for path in root.rglob("*.java"):
-        if "test" in (p.lower() for p in path.parts):
-            continue
-        yield path
+    """Yield every *.java file under src/main/java (so never anything in src/test)."""
+    return (root / "src" / "main" / "java").rglob("*.java")
 
 
 def class_to_test_filename(java_path: Path) -> str:
@@ -71,44 +86,126 @@ def target_test_path(source_file: Path) -> Path:
     return TEST_ROOT.joinpath(*pkg_parts, class_to_test_filename(source_file))
 
 
+# Everything invariant lives in the system prompt so the provider's prompt
+# cache can reuse it across files; the user turn is just the source.
 SYSTEM_PROMPT = (
-    "You are an expert Java developer.  Write production‑ready JUnit 5 tests "
-    "for Spring‑Boot classes.  Use Mockito for dependencies and @SpringBootTest "
-    "only when necessary.  Do not include back‑ticks or markdown fences."
-)
-USER_PROMPT_TMPL = (
-    "Generate a complete JUnit 5 test class for the Spring‑Boot Java class "
-    "below.  Keep the same package declaration, add imports, and include "
-    "meaningful test methods with clear Arrange‑Act‑Assert comments.\n\n"
-    "{code}"
+    "Write a complete JUnit 5 test class for the given Spring‑Boot class.\n"
+    "Keep its package; add imports.\n"
+    "Mockito for dependencies; @SpringBootTest only if needed.\n"
+    "Arrange‑Act‑Assert comments. No markdown fences.\n"
+    "Emit at most 5 concise @Test methods, no javadoc, no explanations."
 )
+SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}   # shared, never mutated
 
 
-def ask_openai(java_code: str) -> Optional[str]:
-    """Return test code or None on error."""
-    try:
-        completion = openai.chat.completions.create(       # type: ignore[attr-defined]
-            model=GPT_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user",   "content": USER_PROMPT_TMPL.format(code=java_code)},
-            ],
-            max_tokens=MAX_TOKENS,
-            temperature=TEMPERATURE,
-        )
-        return completion.choices[0].message.content
-    except Exception as exc:
-        print(f"❌  OpenAI error → {exc}")
-        return None
+JAVA_LINE = re.compile(r"\s*(?:package|import|public|class|@|//|/\*)")
 
 
-def clean_backticks(code: str) -> str:
-    return code.replace("```", "").replace("`", "")
+def read_stream(stream) -> Optional[tuple[str, Optional[str]]]:
+    """Collect the streamed test code and its finish_reason, aborting early if
+    the answer isn't Java.
 
+    Deltas are re‑split into lines. Until a ``` fence shows up every line is
+    kept; once one has opened, only lines inside fences are (prose around the
+    code is dropped), and the fence lines themselves never are.
+    """
+    lines: List[str] = []
+    fenced: Optional[bool] = None         # None → no fence seen yet
+    prose: Optional[int] = 0              # non‑Java chars before the code
+    pending = ""
+    finish_reason: Optional[str] = None
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        pending += choice.delta.content or ""
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            if line.lstrip().startswith("```"):
+                if fenced is None:
+                    lines.clear()         # anything before the first fence was prose
+                    prose = 0
+                fenced = not fenced
+                continue
+            if fenced is False:
+                continue
+            lines.append(line.replace("`", ""))
+            if prose is None or not line.strip():
+                continue
+            if JAVA_LINE.match(line):
+                prose = None              # found the code, stop checking
+            else:
+                prose += len(line)
+        # the unfinished line counts too, so prose without newlines still aborts
+        if (prose is not None and fenced is not False and not JAVA_LINE.match(pending)
+                and prose + len(pending) > ABORT_CHARS):
+            stream.close()
+            print("❌  Answer is not Java, aborted")
+            return None
+    if pending and not pending.lstrip().startswith("```") and fenced is not False:
+        lines.append(pending.replace("`", ""))
+    return "\n".join(lines), finish_reason
+
+
+def ask_openai(java_code: str) -> Optional[tuple[str, Optional[str]]]:
+    """Return (test code, finish_reason) or None on error; backs off and retries when rate‑limited."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            stream = openai.chat.completions.create(       # type: ignore[attr-defined]
+                model=GPT_MODEL,
+                messages=[SYSTEM_MSG, {"role": "user", "content": java_code}],
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE,
+                stream=True,
+            )
+            return read_stream(stream)
+        except openai.RateLimitError as exc:
+            if attempt == MAX_ATTEMPTS - 1:
+                print(f"❌  OpenAI error → {exc}")
+                return None
+            time.sleep(2 ** attempt + random.random())
+        except Exception as exc:
+            print(f"❌  OpenAI error → {exc}")
+            return None
+    return None
+
+
+def sidecar_path(test_path: Path) -> Path:
+    """FooTest.java → FooTest.java.srchash, holding the sha256 of Foo.java."""
+    return test_path.with_suffix(".java.srchash")
+
+
+def generate_for(src: Path) -> Optional[tuple[str, Optional[str]]]:
+    """Return (cleaned test code, source hash), or None if up to date / on error.
+
+    The hash is None when the answer was cut off, so the test is written but
+    regenerated on the next run instead of being marked up to date.
+    """
+    java_bytes = src.read_bytes()
+    src_hash = hashlib.sha256(java_bytes).hexdigest()
+    test_path = target_test_path(src)
+    sidecar = sidecar_path(test_path)
+    if (not FORCE and test_path.exists() and sidecar.exists()
+            and sidecar.read_text(encoding="utf-8") == src_hash):
+        print(f"↩  Unchanged: {src.name}")
+        return None
+
+    answer = ask_openai(java_bytes.decode("utf-8"))
+    if not answer or not answer[0]:
+        return None
+    test_code_raw, finish_reason = answer
+    if finish_reason != "stop":
+        print(f"⚠️  Answer for {src.name} was cut off ({finish_reason}), will retry next run")
+        src_hash = None
+    return test_code_raw.strip(), src_hash
 
-def write_file(path: Path, content: str) -> None:
+
+def write_file(path: Path, content: str, src_hash: Optional[str] = None) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(content, encoding="utf-8")
+    if src_hash:
+        sidecar_path(path).write_text(src_hash, encoding="utf-8")
     print(f"✅  Generated: {path}")
 
 
@@ -123,11 +220,19 @@ def main() -> None:
         print("❌  No Java classes found.")
         return
 
-    for src in sources:
-        java_code = src.read_text(encoding="utf-8")
-        test_code_raw = ask_openai(java_code)
-        if not test_code_raw:
-            continue
+    # the OpenAI client is thread‑safe: submit every file first, collect afterwards
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {pool.submit(generate_for, src): src for src in sources}
+        for future in as_completed(futures):
+            src = futures[future]
+            result = future.result()
+            if not result:
+                continue
+            cleaned, src_hash = result
+
+            out_path = target_test_path(src)
+            write_file(out_path, cleaned, src_hash)
+
 
-        cleaned = clean_backticks(test_code_raw.strip())
-        out_path = target_test_path
+if __name__ == "__main__":
+    main()